@@ -4,13 +4,93 @@ MCP Chat Client - A simple chat interface that uses the MCP server.
 
 import asyncio
 import json
+import re
 import sys
 import os
+import threading
+from contextlib import AsyncExitStack
 from typing import List, Dict, Any, Optional
 from mcp.client.session import ClientSession
 from mcp.client.sse import sse_client
 import mcp.types as types
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+def _pretty_json(obj: Any) -> str:
+    """Render an object as indented JSON for display."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(obj, indent=2)
+
+def _read_stdin(loop: asyncio.AbstractEventLoop, lines: asyncio.Queue):
+    """
+    Feed stdin lines into an asyncio queue; None marks end of input.
+
+    Reads the raw file descriptor with os.read so the thread never holds the
+    sys.stdin buffer lock, which would abort interpreter shutdown while the
+    thread is still blocked on an open pipe.
+    """
+    fd = sys.stdin.fileno()
+    encoding = sys.stdin.encoding or "utf-8"
+    pending = b""
+    while True:
+        chunk = os.read(fd, 4096)
+        if chunk:
+            pending += chunk
+            *complete, pending = pending.split(b"\n")
+            items = [raw.decode(encoding, errors="replace").rstrip("\r") for raw in complete]
+        else:
+            # End of input: flush a final unterminated line, then signal EOF
+            items = [pending.decode(encoding, errors="replace")] if pending else []
+            items.append(None)
+        try:
+            for item in items:
+                loop.call_soon_threadsafe(lines.put_nowait, item)
+        except RuntimeError:
+            # The event loop has already been closed
+            return
+        if not chunk:
+            return
+
+# Cities the demo server has weather data for, in match priority order
+KNOWN_CITIES = ("new york", "london", "tokyo", "sydney", "paris")
+
+# Keywords that trigger a canned tool/resource response in the chat loop
+_KEYWORD_RE = re.compile(r"weather|fact|bmi|temperature|convert|count|word|character")
+
+# key=value command parameters, and the values that should become numbers
+_PARAM_RE = re.compile(r"([^\s=]+)=(\S*)")
+_NUM_RE = re.compile(r"[-+]?(?:\d+(\.\d*)?|(\.\d+))")
+
+def _parse_params(params_str: str, coerce_numbers: bool = False) -> Dict[str, Any]:
+    """
+    Parse whitespace-separated key=value pairs from a command.
+
+    Raises ValueError naming the first token that is not a key=value pair.
+    """
+    leftover = _PARAM_RE.sub(" ", params_str).split()
+    if leftover:
+        raise ValueError(f"Invalid parameter format '{leftover[0]}'. Use param=value.")
+    
+    params: Dict[str, Any] = {}
+    for key, value in _PARAM_RE.findall(params_str):
+        match = _NUM_RE.fullmatch(value) if coerce_numbers else None
+        if match is None:
+            params[key] = value
+        elif match.group(1) or match.group(2):
+            params[key] = float(value)
+        else:
+            params[key] = int(value)
+    return params
+
 class MCPChatClient:
     """A simple chat client that uses the MCP server."""
     
@@ -18,62 +98,92 @@ class MCPChatClient:
         """Initialize the chat client."""
         self.server_url = server_url
         self.session = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._input_lines: Optional[asyncio.Queue] = None
         self.conversation_history: List[Dict[str, Any]] = []
         self.available_tools: List[str] = []
         self.available_resources: List[str] = []
         self.available_prompts: List[str] = []
     
+    async def __aenter__(self) -> "MCPChatClient":
+        await self.connect()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def connect(self):
+        """Open the SSE connection and MCP session, reused for every request."""
+        if self.session is not None:
+            return
+        self._exit_stack = AsyncExitStack()
+        try:
+            read_stream, write_stream = await self._exit_stack.enter_async_context(
+                sse_client(self.server_url)
+            )
+            self.session = await self._exit_stack.enter_async_context(
+                ClientSession(read_stream, write_stream)
+            )
+            await self.initialize()
+        except BaseException:
+            await self.close()
+            raise
+    
+    async def close(self):
+        """Close the MCP session and its SSE connection."""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._exit_stack = None
+        self.session = None
+    
     async def initialize(self):
         """Initialize the client by fetching available tools, resources, and prompts."""
         try:
-            # Create SSE client and get streams
-            async with sse_client(self.server_url) as (read_stream, write_stream):
-                # Create client session
-                self.session = ClientSession(read_stream, write_stream)
-                await self.session.initialize()
-                
-                # Get server info
-                server_info = await self.session.send_request(
-                    types.ClientRequest(
-                        types.GetServerInfoRequest(method="server/info")
-                    ),
-                    types.GetServerInfoResult
-                )
-                print(f"Connected to MCP server: {server_info.get('name', 'Unknown')}")
-                
-                # Get available tools
-                tools = await self.session.list_tools()
-                self.available_tools = [tool["id"] for tool in tools]
-                print(f"Available tools: {', '.join(self.available_tools)}")
-                
-                # Get available resources
-                resources = await self.session.list_resources()
-                self.available_resources = [resource["id"] for resource in resources]
-                print(f"Available resources: {', '.join(self.available_resources)}")
-                
-                # Get available prompts
-                prompts = await self.session.list_prompts()
-                self.available_prompts = [prompt["id"] for prompt in prompts]
-                print(f"Available prompts: {', '.join(self.available_prompts)}")
-                
-                # Start with a greeting prompt
-                greeting = await self.session.get_prompt("greeting")
-                print("\n" + "=" * 50)
-                print("Assistant: " + greeting)
-                print("=" * 50 + "\n")
-                
-                # Add to conversation history
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": greeting
-                })
-                
+            await self.session.initialize()
+            
+            # Get server info
+            server_info = await self.session.send_request(
+                types.ClientRequest(
+                    types.GetServerInfoRequest(method="server/info")
+                ),
+                types.GetServerInfoResult
+            )
+            print(f"Connected to MCP server: {server_info.get('name', 'Unknown')}")
+            
+            # Get available tools
+            tools = await self.session.list_tools()
+            self.available_tools = [tool["id"] for tool in tools]
+            print(f"Available tools: {', '.join(self.available_tools)}")
+            
+            # Get available resources
+            resources = await self.session.list_resources()
+            self.available_resources = [resource["id"] for resource in resources]
+            print(f"Available resources: {', '.join(self.available_resources)}")
+            
+            # Get available prompts
+            prompts = await self.session.list_prompts()
+            self.available_prompts = [prompt["id"] for prompt in prompts]
+            print(f"Available prompts: {', '.join(self.available_prompts)}")
+            
+            # Start with a greeting prompt
+            greeting = await self.session.get_prompt("greeting")
+            print("\n" + "=" * 50)
+            print("Assistant: " + greeting)
+            print("=" * 50 + "\n")
+            
+            # Add to conversation history
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": greeting
+            })
+            
         except Exception as e:
             print(f"Error initializing client: {e}")
             sys.exit(1)
     
     async def process_command(self, command: str) -> Optional[str]:
         """Process a special command."""
+        cmd, _, rest = command.partition(" ")
         if command == "/help":
             return """
 Available commands:
@@ -101,67 +211,50 @@ To use a prompt: /prompt <prompt_id> <param1>=<value1> <param2>=<value2> ...
             self.conversation_history = []
             return "Conversation history cleared."
         
-        elif command.startswith("/tool "):
+        elif cmd == "/tool":
             # Parse tool command: /tool tool_name param1=value1 param2=value2
-            parts = command[6:].strip().split()
-            if not parts:
+            tool_name, _, params_str = rest.strip().partition(" ")
+            if not tool_name:
                 return "Error: Tool name is required."
             
-            tool_name = parts[0]
             if tool_name not in self.available_tools:
                 return f"Error: Tool '{tool_name}' not found."
             
-            # Parse parameters
-            params = {}
-            for param in parts[1:]:
-                if "=" not in param:
-                    return f"Error: Invalid parameter format '{param}'. Use param=value."
-                
-                key, value = param.split("=", 1)
-                # Try to convert to appropriate type
-                try:
-                    # Try as number
-                    if "." in value:
-                        params[key] = float(value)
-                    else:
-                        params[key] = int(value)
-                except ValueError:
-                    # Keep as string
-                    params[key] = value
+            # Parse parameters, converting numeric values
+            try:
+                params = _parse_params(params_str, coerce_numbers=True)
+            except ValueError as e:
+                return f"Error: {e}"
             
             try:
                 result = await self.session.call_tool(tool_name, arguments=params)
-                return f"Tool result: {json.dumps(result, indent=2)}"
+                return f"Tool result: {_pretty_json(result)}"
             except Exception as e:
                 return f"Error using tool: {e}"
         
-        elif command.startswith("/resource "):
+        elif cmd == "/resource":
             # Parse resource command: /resource resource_uri
-            resource_uri = command[10:].strip()
+            resource_uri = rest.strip()
             try:
                 result = await self.session.read_resource(resource_uri)
-                return f"Resource content: {json.dumps(result, indent=2)}"
+                return f"Resource content: {_pretty_json(result)}"
             except Exception as e:
                 return f"Error getting resource: {e}"
         
-        elif command.startswith("/prompt "):
+        elif cmd == "/prompt":
             # Parse prompt command: /prompt prompt_id param1=value1 param2=value2
-            parts = command[8:].strip().split()
-            if not parts:
+            prompt_id, _, params_str = rest.strip().partition(" ")
+            if not prompt_id:
                 return "Error: Prompt ID is required."
             
-            prompt_id = parts[0]
             if prompt_id not in self.available_prompts:
                 return f"Error: Prompt '{prompt_id}' not found."
             
             # Parse parameters
-            params = {}
-            for param in parts[1:]:
-                if "=" not in param:
-                    return f"Error: Invalid parameter format '{param}'. Use param=value."
-                
-                key, value = param.split("=", 1)
-                params[key] = value
+            try:
+                params = _parse_params(params_str)
+            except ValueError as e:
+                return f"Error: {e}"
             
             try:
                 result = await self.session.get_prompt(prompt_id, arguments=params)
@@ -172,13 +265,35 @@ To use a prompt: /prompt <prompt_id> <param1>=<value1> <param2>=<value2> ...
         return None
     
     async def run(self):
-        """Run the chat client."""
-        await self.initialize()
-        
+        """Run the chat client, connecting first if needed."""
+        if self.session is None:
+            async with self:
+                await self._chat_loop()
+        else:
+            await self._chat_loop()
+    
+    async def _read_input(self, prompt: str) -> Optional[str]:
+        """Prompt for a line of input without blocking the event loop."""
+        if self._input_lines is None:
+            # A daemon thread, so interpreter shutdown never waits on the reader
+            self._input_lines = asyncio.Queue()
+            threading.Thread(
+                target=_read_stdin,
+                args=(asyncio.get_running_loop(), self._input_lines),
+                daemon=True,
+            ).start()
+        print(prompt, end="", flush=True)
+        return await self._input_lines.get()
+    
+    async def _chat_loop(self):
+        """Read user input and respond until the user exits."""
         while True:
             try:
-                # Get user input
-                user_input = input("You: ")
+                # Get user input; None means stdin was closed
+                user_input = await self._read_input("You: ")
+                if user_input is None:
+                    print("\nGoodbye!")
+                    break
                 
                 # Check for exit command
                 if user_input.strip() == "/exit":
@@ -208,13 +323,11 @@ To use a prompt: /prompt <prompt_id> <param1>=<value1> <param2>=<value2> ...
                 response = f"You said: {user_input}"
                 
                 # Check for some keywords to demonstrate tool usage
-                if "weather" in user_input.lower():
-                    # Extract city name (simplified)
-                    city = "london"  # Default
-                    for known_city in ["new york", "london", "tokyo", "sydney", "paris"]:
-                        if known_city in user_input.lower():
-                            city = known_city
-                            break
+                lowered = user_input.lower()
+                keywords = set(_KEYWORD_RE.findall(lowered))
+                if "weather" in keywords:
+                    # Extract city name (simplified), defaulting to London
+                    city = next((c for c in KNOWN_CITIES if c in lowered), "london")
                     
                     try:
                         weather = await self.session.read_resource(f"weather://{city}")
@@ -222,20 +335,20 @@ To use a prompt: /prompt <prompt_id> <param1>=<value1> <param2>=<value2> ...
                     except Exception as e:
                         response = f"Sorry, I couldn't get the weather information: {e}"
                 
-                elif "fact" in user_input.lower():
+                elif "fact" in keywords:
                     try:
                         fact = await self.session.read_resource("facts://random")
                         response = f"Here's an interesting fact: {fact}"
                     except Exception as e:
                         response = f"Sorry, I couldn't get a fact: {e}"
                 
-                elif "bmi" in user_input.lower():
+                elif "bmi" in keywords:
                     response = "To calculate BMI, use the command: /tool calculate_bmi weight_kg=<weight> height_m=<height>"
                 
-                elif "temperature" in user_input.lower() and "convert" in user_input.lower():
+                elif "temperature" in keywords and "convert" in keywords:
                     response = "To convert temperature, use the command: /tool convert_temperature value=<value> from_unit=<C/F/K> to_unit=<C/F/K>"
                 
-                elif "count" in user_input.lower() and ("word" in user_input.lower() or "character" in user_input.lower()):
+                elif "count" in keywords and ("word" in keywords or "character" in keywords):
                     response = "To count words and characters, use the command: /tool word_count text=<your text>"
                 
                 # Add response to conversation history
@@ -260,9 +373,16 @@ async def main():
     # Get server URL from environment variable or use default
     server_url = os.environ.get("MCP_SERVER_URL", "http://localhost:8000")
     
-    # Create and run the chat client
-    chat_client = MCPChatClient(server_url=server_url)
-    await chat_client.run()
+    # Create and run the chat client over a single long-lived session
+    async with MCPChatClient(server_url=server_url) as chat_client:
+        await chat_client.run()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # Ctrl-C cancels main(); its async with blocks close the session on the way out
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nGoodbye!") 
\ No newline at end of file
@@ -7,6 +7,11 @@ import json
 from mcp.client.session import ClientSession
 from mcp.client.sse import sse_client
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configure logging
 
 async def main():
@@ -83,4 +88,7 @@ async def main():
         print(f"\nEcho Result: {echo_result}")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main()) 
@@ -1,5 +1,3 @@
-from transitions.extensions.asyncio import AsyncMachine
-import pyperclip
 import asyncio
 import time
 
@@ -11,13 +9,13 @@ class AsyncModel:
         self.start_time = time.time()
 
     async def before_change(self):
-        print("I am asynchronous and will block now for 100 milliseconds.")
+        print("I am asynchronous and will block now for 1 second.")
         await asyncio.sleep(1)
         print("I am done waiting.")
 
     def sync_before_change(self):
         print(
-            "I am synchronous and will block the event loop (what I probably shouldn't)"
+            "I am synchronous and would block the event loop, so I run in a worker thread"
         )
         time.sleep(3)
         print("I am done waiting synchronously.")
@@ -27,34 +25,29 @@ class AsyncModel:
             f"I am synchronous again. Execution took {int((time.time() - self.start_time) * 1000)} ms."
         )
 
+    async def start(self):
+        self.prepare_model()
+        # execute before function asynchronously 5 times
+        await asyncio.gather(*(self.before_change() for _ in range(5)))
+        # keep the event loop free while the blocking callback runs
+        await asyncio.to_thread(self.sync_before_change)
+        self.after_change()
 
-transition = dict(
-    trigger="start",
-    source="Start",
-    dest="Done",
-    prepare="prepare_model",
-    before=["before_change"] * 5 + ["sync_before_change"],
-    after="after_change")  # execute before function in asynchronously 5 times
 
 model = AsyncModel()
-machine = AsyncMachine(model,
-                       states=["Start", "Done"],
-                       transitions=[transition],
-                       initial='Start')
 
 asyncio.run(model.start())
 # >>> I am synchronous.
-#     I am asynchronous and will block now for 100 milliseconds.
-#     I am asynchronous and will block now for 100 milliseconds.
-#     I am asynchronous and will block now for 100 milliseconds.
-#     I am asynchronous and will block now for 100 milliseconds.
-#     I am asynchronous and will block now for 100 milliseconds.
-#     I am synchronous and will block the event loop (what I probably shouldn't)
-#     I am done waiting synchronously.
+#     I am asynchronous and will block now for 1 second.
+#     I am asynchronous and will block now for 1 second.
+#     I am asynchronous and will block now for 1 second.
+#     I am asynchronous and will block now for 1 second.
+#     I am asynchronous and will block now for 1 second.
 #     I am done waiting.
 #     I am done waiting.
 #     I am done waiting.
 #     I am done waiting.
 #     I am done waiting.
-#     I am synchronous again. Execution took 101 ms.
-# assert model.is_Done()
+#     I am synchronous and would block the event loop, so I run in a worker thread
+#     I am done waiting synchronously.
+#     I am synchronous again. Execution took 4004 ms.
@@ -2,16 +2,25 @@
 MCP Server Demo - A simple demonstration of a Model Context Protocol server.
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any, AsyncGenerator
+import os
+import random
+from typing import Dict, List, Optional, Any, AsyncGenerator, Tuple
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.sse import SseServerTransport
 from mcp.types import PromptMessage, TextContent
 from starlette.responses import StreamingResponse
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +37,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class NonStreamingGZipMiddleware(GZipMiddleware):
+    """GZip middleware that never wraps the SSE stream.
+
+    Older Starlette releases gzip text/event-stream responses without
+    flushing each frame, so the stream is bypassed explicitly and its
+    compression is left to the reverse proxy.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/sse":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress larger non-streaming responses
+app.add_middleware(NonStreamingGZipMiddleware, minimum_size=512)
+
 # Create SSE transport
 sse_transport = SseServerTransport("/messages/")
 
@@ -51,6 +77,65 @@ FACTS = [
     "The average cloud weighs about 1.1 million pounds.",
 ]
 
+# Initialization response sent at the start of every SSE connection
+INIT_RESPONSE = {
+    "jsonrpc": "2.0",
+    "id": 0,
+    "result": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {
+            "sampling": {},
+            "roots": {
+                "listChanged": True
+            }
+        },
+        "serverInfo": {
+            "name": "mcp-server-demo",
+            "version": "0.1.0"
+        }
+    }
+}
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize an object to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _build_sse_frame(payload: bytes) -> bytes:
+    """Wrap an encoded payload in an SSE data frame."""
+    return b"data: " + payload + b"\n\n"
+
+# Pre-encoded frames for the constant parts of the SSE protocol
+_INIT_FRAME = _build_sse_frame(_dumps(INIT_RESPONSE))
+_ERR_TMPL = b'{"jsonrpc":"2.0","id":1,"error":{"code":-32000,"message":%s,"data":null}}'
+
+def _build_error_frame(error: Exception) -> bytes:
+    """Build the SSE frame for a JSON-RPC server error."""
+    return _build_sse_frame(_ERR_TMPL % _dumps(str(error)))
+
+# Most frames buffered per SSE client before the transport waits for it to drain
+SSE_QUEUE_MAXSIZE = int(os.environ.get("SSE_QUEUE_MAXSIZE", "1024"))
+# Upper bound on bytes coalesced into a single SSE write
+SSE_MAX_BATCH_BYTES = int(os.environ.get("SSE_MAX_BATCH_BYTES", "65536"))
+# Queued by the MCP server task once it has finished
+_STREAM_END = object()
+
+def _drain_frames(queue: asyncio.Queue, first: bytes, limit: int) -> Tuple[bytes, bool]:
+    """Coalesce already-queued frames behind `first` into one chunk.
+
+    Returns the joined chunk and whether the end-of-stream marker was reached.
+    """
+    batch = [first]
+    size = len(first)
+    while size < limit and not queue.empty():
+        frame = queue.get_nowait()
+        if frame is _STREAM_END:
+            return b"".join(batch), True
+        batch.append(frame)
+        size += len(frame)
+    return b"".join(batch), False
+
 # Health check endpoint
 @app.get("/")
 async def health_check():
@@ -62,88 +147,76 @@ async def handle_sse(request: Request):
     async def event_generator() -> AsyncGenerator[bytes, None]:
         try:
             logger.info("Starting SSE connection")
+            # Every frame for this client goes through one queue, so that the
+            # transport's events can be batched with the generator's own frames
+            frames: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_MAXSIZE)
+
             # Create a custom send function that properly handles ASGI messages
             async def custom_send(message):
-                print(message)
-                message_type = message.get("type")
-                print("Message type:", message_type)
+                message_type = message["type"]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("ASGI send %s", message_type)
                 if message_type == "http.response.start":
-                    # Store the headers but don't send the start message
-                    headers = [
-                        [b"content-type", b"text/event-stream"],
-                        [b"cache-control", b"no-cache"],
-                        [b"connection", b"keep-alive"],
-                        [b"x-accel-buffering", b"no"]
-                    ]
-                    message["headers"] = headers
-                    # Don't send the start message, just store it
+                    # StreamingResponse already sent the start message with
+                    # the SSE headers, so the transport's copy is dropped
+                    return
+                if message_type == "http.response.body":
+                    # The response ends when the server task finishes, so
+                    # only the body bytes are kept
+                    body = message.get("body", b"")
+                    if body:
+                        await frames.put(body)
                     return
-                elif message_type == "http.response.body":
-                    # Send the body message
-                    await request._send(message)
-                else:
-                    # Handle other message types
-                    await request._send(message)
+                await request._send(message)
 
             logger.info("Establishing SSE connection")
             async with sse_transport.connect_sse(
                 request.scope, request.receive, custom_send
             ) as streams:
                 logger.info("SSE connection established, starting MCP server")
+
+                # Send initialization response
+                logger.info("Sending initialization response")
+                frames.put_nowait(_INIT_FRAME)
+
+                async def run_server():
+                    try:
+                        # Start the MCP server
+                        logger.info("Starting MCP server")
+                        await mcp._mcp_server.run(
+                            streams[0],
+                            streams[1],
+                            mcp._mcp_server.create_initialization_options()
+                        )
+                    except Exception as e:
+                        logger.error("Error in MCP server run: %s", e, exc_info=True)
+                        await frames.put(_build_error_frame(e))
+                    # Not reached on cancellation, when the generator is already closing
+                    await frames.put(_STREAM_END)
+
+                server_task = asyncio.create_task(run_server())
                 try:
-                    # Send initialization response
-                    init_response = {
-                        "jsonrpc": "2.0",
-                        "id": 0,
-                        "result": {
-                            "protocolVersion": "2024-11-05",
-                            "capabilities": {
-                                "sampling": {},
-                                "roots": {
-                                    "listChanged": True
-                                }
-                            },
-                            "serverInfo": {
-                                "name": "mcp-server-demo",
-                                "version": "0.1.0"
-                            }
-                        }
-                    }
-                    logger.info("Sending initialization response")
-                    yield f"data: {json.dumps(init_response)}\n\n".encode()
-                    
-                    # Start the MCP server
-                    logger.info("Starting MCP server")
-                    await mcp._mcp_server.run(
-                        streams[0],
-                        streams[1],
-                        mcp._mcp_server.create_initialization_options()
-                    )
-                except Exception as e:
-                    logger.error(f"Error in MCP server run: {str(e)}", exc_info=True)
-                    error_message = {
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "error": {
-                            "code": -32000,
-                            "message": str(e),
-                            "data": None
-                        }
-                    }
-                    yield f"data: {json.dumps(error_message)}\n\n".encode()
-                    return
+                    while True:
+                        # Idle streams are kept open by the transport's own
+                        # ping events, which arrive through this queue too
+                        frame = await frames.get()
+                        if frame is _STREAM_END:
+                            return
+                        # Send everything that is already waiting in one write
+                        chunk, finished = _drain_frames(frames, frame, SSE_MAX_BATCH_BYTES)
+                        yield chunk
+                        if finished:
+                            return
+                finally:
+                    # Stop the server while the transport streams are still open
+                    server_task.cancel()
+                    try:
+                        await server_task
+                    except asyncio.CancelledError:
+                        pass
         except Exception as e:
-            logger.error(f"Error in SSE connection: {str(e)}", exc_info=True)
-            error_message = {
-                "jsonrpc": "2.0",
-                "id": 1,
-                "error": {
-                    "code": -32000,
-                    "message": str(e),
-                    "data": None
-                }
-            }
-            yield f"event: message\ndata: {json.dumps(error_message)}\n\n".encode()
+            logger.error("Error in SSE connection: %s", e, exc_info=True)
+            yield b"event: message\n" + _build_error_frame(e)
     
     return StreamingResponse(
         event_generator(),
@@ -165,7 +238,9 @@ async def handle_post_message(request: Request):
             logger.warning("Received empty message body")
             return {"status": "error", "message": "Empty message body"}
             
-        logger.info(f"Received message: {body}")
+        logger.info("Received message (%d bytes)", len(body))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Message body: %s", body.decode("utf-8", errors="replace"))
         
         # Create a custom send function for the message endpoint
         async def custom_send(message):
@@ -173,16 +248,24 @@ async def handle_post_message(request: Request):
                 return
             await request._send(message)
             
-        # Create a new request with the stored body
+        # Replay the stored body once, then report the client as disconnected
+        request_message = {"type": "http.request", "body": body, "more_body": False}
+        disconnect_message = {"type": "http.disconnect"}
+        body_sent = False
+
         async def receive():
-            return {"type": "http.request.body", "body": body, "more_body": False}
+            nonlocal body_sent
+            if body_sent:
+                return disconnect_message
+            body_sent = True
+            return request_message
             
         await sse_transport.handle_post_message(
             request.scope, receive, custom_send
         )
         return {"status": "ok"}
     except Exception as e:
-        logger.error(f"Error handling message: {str(e)}", exc_info=True)
+        logger.error("Error handling message: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
 # Define prompts
@@ -238,7 +321,6 @@ def get_weather(city: str) -> str:
 @mcp.resource("facts://random")
 def get_random_fact() -> str:
     """Get a random interesting fact."""
-    import random
     return random.choice(FACTS)
 
 @mcp.resource("facts://all")
@@ -262,15 +344,14 @@ def calculate_bmi(weight_kg: float, height_m: float) -> Dict[str, Any]:
     if weight_kg <= 0 or height_m <= 0:
         return {"error": "Weight and height must be positive values"}
     
-    bmi = weight_kg / (height_m ** 2)
+    bmi = weight_kg / (height_m * height_m)
     
     # Determine BMI category
-    category = ""
     if bmi < 18.5:
         category = "Underweight"
-    elif 18.5 <= bmi < 25:
+    elif bmi < 25:
         category = "Normal weight"
-    elif 25 <= bmi < 30:
+    elif bmi < 30:
         category = "Overweight"
     else:
         category = "Obese"
@@ -280,6 +361,19 @@ def calculate_bmi(weight_kg: float, height_m: float) -> Dict[str, Any]:
         "category": category
     }
 
+# Direct conversion for every (from_unit, to_unit) pair
+TEMPERATURE_CONVERSIONS = {
+    ('C', 'C'): lambda v: v,
+    ('C', 'F'): lambda v: v * 9/5 + 32,
+    ('C', 'K'): lambda v: v + 273.15,
+    ('F', 'C'): lambda v: (v - 32) * 5/9,
+    ('F', 'F'): lambda v: v,
+    ('F', 'K'): lambda v: (v - 32) * 5/9 + 273.15,
+    ('K', 'C'): lambda v: v - 273.15,
+    ('K', 'F'): lambda v: (v - 273.15) * 9/5 + 32,
+    ('K', 'K'): lambda v: v,
+}
+
 @mcp.tool()
 def convert_temperature(value: float, from_unit: str, to_unit: str) -> Dict[str, Any]:
     """
@@ -297,25 +391,11 @@ def convert_temperature(value: float, from_unit: str, to_unit: str) -> Dict[str,
     to_unit = to_unit.upper()
     
     # Validate units
-    valid_units = ['C', 'F', 'K']
-    if from_unit not in valid_units or to_unit not in valid_units:
+    convert = TEMPERATURE_CONVERSIONS.get((from_unit, to_unit))
+    if convert is None:
         return {"error": "Units must be 'C', 'F', or 'K'"}
     
-    # Convert to Celsius first
-    if from_unit == 'C':
-        celsius = value
-    elif from_unit == 'F':
-        celsius = (value - 32) * 5/9
-    else:  # Kelvin
-        celsius = value - 273.15
-    
-    # Convert from Celsius to target unit
-    if to_unit == 'C':
-        result = celsius
-    elif to_unit == 'F':
-        result = celsius * 9/5 + 32
-    else:  # Kelvin
-        result = celsius + 273.15
+    result = convert(value)
     
     return {
         "original_value": value,
@@ -359,7 +439,7 @@ async def echo_with_context(message: str, ctx: Context) -> str:
         The echoed message with context information
     """
     # Log the request
-    logger.info(f"Echo request received: {message}")
+    logger.info("Echo request received: %s", message)
     
     # Get request ID from context
     request_id = ctx.request_context.request_id
@@ -368,4 +448,4 @@ async def echo_with_context(message: str, ctx: Context) -> str:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, ws="none")
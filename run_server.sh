@@ -12,4 +12,4 @@ fi
 
 # Run the server
 echo "Starting MCP server..."
-uvicorn main:app --reload --host 0.0.0.0 --port 8000 
\ No newline at end of file
+uvicorn main:app --reload --host 0.0.0.0 --port 8000 --ws none 
\ No newline at end of file